@@ -2,6 +2,9 @@ import os
 import re
 import argparse
 
+# Captures the chapter number before the first underscore, e.g. "0585_1....txt"
+CHAPTER_FILENAME_PATTERN = re.compile(r"(\d+)_.*\.txt$")
+
 
 def rename_chapter_files(directory_path):
     """
@@ -23,7 +26,7 @@ def rename_chapter_files(directory_path):
         # It expects one or more digits at the beginning, followed by an underscore.
         # Example: "0585_1..." -> captures "0585"
         # Example: "1192_1..." -> captures "1192"
-        match = re.match(r"(\d+)_.*\.txt$", filename)
+        match = CHAPTER_FILENAME_PATTERN.match(filename)
 
         if match:
             original_number_str = match.group(1)  # This is the "0585", "1192", etc.
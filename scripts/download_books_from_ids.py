@@ -47,6 +47,31 @@ PROMO_TEXTS_TO_REMOVE_PATTERNS = [
     re.compile(r"target=_blank>起点中文网</a>", re.IGNORECASE | re.DOTALL),
 ]
 
+# Class/id patterns of ad and navigation elements inside the chapter content
+AD_ELEMENT_PATTERNS = [
+    re.compile(ad_pattern_text, re.I)
+    for ad_pattern_text in [
+        r"ads",
+        r"recommend",
+        r"social",
+        r"share",
+        r"comment",
+        r"nav",
+        r"banner",
+        r"promo",
+        r"bottom-bar",
+        r"notice",
+        r"tip",
+    ]
+]
+# Site name suffixes of the <title> tag
+TITLE_SUFFIX_PATTERN = re.compile(
+    r" - .*$|\|.*$|_凡人修仙传.*$|在线阅读.*$|_小说.*$|_笔趣阁.*$", re.I
+)
+BLANK_LINES_PATTERN = re.compile(r"\n\s*\n+")
+UNSAFE_FILENAME_CHARS_PATTERN = re.compile(r"[^\w\s.-]")
+FILENAME_SEPARATORS_PATTERN = re.compile(r"[-\s]+")
+
 
 def fetch_url(url):
     for attempt in range(RETRY_ATTEMPTS):
@@ -95,12 +120,7 @@ def extract_chapter_content(html_content):
         page_html_title_tag = soup.find("title")
         if page_html_title_tag:
             page_title_text = page_html_title_tag.get_text(strip=True)
-            page_title_text = re.sub(
-                r" - .*$|\|.*$|_凡人修仙传.*$|在线阅读.*$|_小说.*$|_笔趣阁.*$",
-                "",
-                page_title_text,
-                flags=re.I,
-            ).strip()
+            page_title_text = TITLE_SUFFIX_PATTERN.sub("", page_title_text).strip()
             if page_title_text and len(page_title_text) < 150:
                 extracted_chapter_title = page_title_text
         elif soup.find("h1"):
@@ -139,20 +159,7 @@ def extract_chapter_content(html_content):
     ]:
         for tag in content_div.find_all(unwanted_tag_name):
             tag.decompose()
-    for ad_pattern_text in [
-        r"ads",
-        r"recommend",
-        r"social",
-        r"share",
-        r"comment",
-        r"nav",
-        r"banner",
-        r"promo",
-        r"bottom-bar",
-        r"notice",
-        r"tip",
-    ]:
-        ad_regex = re.compile(ad_pattern_text, re.I)
+    for ad_regex in AD_ELEMENT_PATTERNS:
         for ad_element in content_div.find_all(class_=ad_regex):
             ad_element.decompose()
         for ad_element_id in content_div.find_all(id=ad_regex):
@@ -172,7 +179,7 @@ def extract_chapter_content(html_content):
     full_text = "".join(text_parts)
     for pattern in PROMO_TEXTS_TO_REMOVE_PATTERNS:
         full_text = pattern.sub("", full_text)
-    full_text = re.sub(r"\n\s*\n+", "\n\n", full_text)
+    full_text = BLANK_LINES_PATTERN.sub("\n\n", full_text)
     full_text = full_text.strip()
     return full_text if full_text else None, extracted_chapter_title
 
@@ -181,8 +188,8 @@ def save_chapter_to_file(chapter_num_for_filename, title, content, book_specific
     if not os.path.exists(book_specific_dir):
         os.makedirs(book_specific_dir, exist_ok=True)
 
-    safe_title = re.sub(r"[^\w\s.-]", "", title).strip()
-    safe_title = re.sub(r"[-\s]+", "_", safe_title)
+    safe_title = UNSAFE_FILENAME_CHARS_PATTERN.sub("", title).strip()
+    safe_title = FILENAME_SEPARATORS_PATTERN.sub("_", safe_title)
     if not safe_title:
         safe_title = "chapter"
     filename = f"{chapter_num_for_filename}_{safe_title}.txt"
@@ -25,6 +25,7 @@ HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 }
 # REQUEST_TIMEOUT etc. might still be used if you fetch other pages directly
+BOOK_LINK_PATTERN = re.compile(r"/read/(\d+)/?")
 
 
 def extract_ids_from_html(html_content):  # Same as your original script
@@ -40,7 +41,7 @@ def extract_ids_from_html(html_content):  # Same as your original script
     for link_tag in item_links:
         href = link_tag.get("href")
         if href:
-            match = re.search(r"/read/(\d+)/?", href)
+            match = BOOK_LINK_PATTERN.search(href)
             if match:
                 book_ids.add(match.group(1))
     return book_ids
@@ -16,6 +16,10 @@ logging.basicConfig(
 ES_HOST = "http://localhost:9200"
 # If you enabled security and have a password:
 # ES_HOST = 'http://elastic:P@ssw0rd@localhost:9200' # Or your actual credentials
+BOOK_FILENAME_PATTERN = re.compile(r"book_(\d+)\.zip")
+# chapters per bulk request, and a byte cap for books with very long chapters
+BULK_SIZE = 500
+BULK_MAX_BYTES = 5 * 1024 * 1024
 
 
 # --- Main Script ---
@@ -24,7 +28,7 @@ def get_book_id_from_filename(filename):
     Extracts book ID if filename strictly matches 'book_<digits>.zip'.
     Returns the ID (string) or None if it doesn't match or has extra names.
     """
-    match = re.fullmatch(r"book_(\d+)\.zip", filename)
+    match = BOOK_FILENAME_PATTERN.fullmatch(filename)
     if match:
         return match.group(1)
     return None
@@ -51,56 +55,71 @@ def create_index_if_not_exists(es_client, index_name):
     return True
 
 
-def process_book(es_client, zip_filepath, book_id):
+def iter_chapter_actions(zf, zip_filepath, index_name):
+    """Yields one bulk index action per chapter, reading chapters lazily."""
+    for member_info in zf.infolist():
+        if (
+            not member_info.is_dir()
+            and member_info.filename.endswith(".txt")
+            and "/" in member_info.filename
+        ):
+            try:
+                chapter_filename = os.path.basename(member_info.filename)
+                chapter_num_str = os.path.splitext(chapter_filename)[0]
+                chapter_number = int(chapter_num_str)
+
+                with zf.open(member_info.filename) as chapter_file:
+                    content = chapter_file.read().decode("utf-8", errors="ignore")
+
+                doc = {
+                    "chapter_number": chapter_number,
+                    "chapter_name": chapter_filename,
+                    "chapter_content": content.strip(),
+                }
+                # a fixed id per chapter makes a retried bulk overwrite the
+                # chapters it already indexed instead of duplicating them
+                yield {"_index": index_name, "_id": chapter_number, "_source": doc}
+
+            except ValueError:
+                logging.warning(
+                    f"Could not parse chapter number from '{member_info.filename}' in {zip_filepath}. Skipping."
+                )
+            except Exception as e:
+                logging.error(
+                    f"Error processing chapter '{member_info.filename}' in {zip_filepath}: {e}"
+                )
+
+
+def process_book(es_client, zip_filepath, book_id, bulk_size=BULK_SIZE):
     """Processes a single book zip file and ingests its chapters into Elasticsearch."""
     index_name = f"book_{book_id}"
 
     if not create_index_if_not_exists(es_client, index_name):
         return 0
 
-    actions = []
     chapters_processed = 0
 
     try:
         with zipfile.ZipFile(zip_filepath, "r") as zf:
             logging.info(f"Processing book: {zip_filepath} for index {index_name}")
-            for member_info in zf.infolist():
-                if (
-                    not member_info.is_dir()
-                    and member_info.filename.endswith(".txt")
-                    and "/" in member_info.filename
-                ):
-                    try:
-                        chapter_filename = os.path.basename(member_info.filename)
-                        chapter_num_str = os.path.splitext(chapter_filename)[0]
-                        chapter_number = int(chapter_num_str)
-
-                        with zf.open(member_info.filename) as chapter_file:
-                            content = chapter_file.read().decode(
-                                "utf-8", errors="ignore"
-                            )
-
-                        doc = {
-                            "chapter_number": chapter_number,
-                            "chapter_name": chapter_filename,
-                            "chapter_content": content.strip(),
-                        }
-                        actions.append({"_index": index_name, "_source": doc})
-                        chapters_processed += 1
-
-                    except ValueError:
-                        logging.warning(
-                            f"Could not parse chapter number from '{member_info.filename}' in {zip_filepath}. Skipping."
-                        )
-                    except Exception as e:
-                        logging.error(
-                            f"Error processing chapter '{member_info.filename}' in {zip_filepath}: {e}"
-                        )
-
-            if actions:
-                helpers.bulk(es_client, actions)
+            # streaming_bulk consumes the generator in chunks, so only one batch
+            # of chapters is held in memory instead of the whole book; chapters
+            # are counted as they are acknowledged, so a failure part way through
+            # still reports the ones already indexed
+            for ok, item in helpers.streaming_bulk(
+                es_client.options(request_timeout=60),
+                iter_chapter_actions(zf, zip_filepath, index_name),
+                chunk_size=bulk_size,
+                max_chunk_bytes=BULK_MAX_BYTES,
+                raise_on_error=False,
+            ):
+                if ok:
+                    chapters_processed += 1
+                else:
+                    logging.error(f"Failed to index a chapter in {index_name}: {item}")
+            if chapters_processed:
                 logging.info(
-                    f"Successfully bulk indexed {len(actions)} chapters for {index_name}"
+                    f"Successfully bulk indexed {chapters_processed} chapters for {index_name}"
                 )
 
     except zipfile.BadZipFile:
@@ -128,6 +147,12 @@ def main():
         default=ES_HOST,
         help=f"Elasticsearch host URL. Defaults to {ES_HOST}",
     )
+    parser.add_argument(
+        "--bulk-size",
+        type=int,
+        default=BULK_SIZE,
+        help=f"Number of chapters sent per bulk request. Defaults to {BULK_SIZE}",
+    )
     args = parser.parse_args()
 
     books_dir = args.books_directory
@@ -142,7 +167,15 @@ def main():
     logging.info(f"Connecting to Elasticsearch at: {es_host_url}")
 
     try:
-        es = Elasticsearch(es_host_url, request_timeout=30)
+        # chapter bodies compress well, and retries cover a busy node during bulk;
+        # retried bulks are idempotent since each chapter has a fixed _id
+        es = Elasticsearch(
+            es_host_url,
+            request_timeout=30,
+            http_compress=True,
+            retry_on_timeout=True,
+            max_retries=3,
+        )
         if not es.ping():
             logging.error(f"Failed to connect to Elasticsearch at {es_host_url}")
             return
@@ -160,7 +193,9 @@ def main():
             zip_filepath = os.path.join(books_dir, filename)  # Use the parsed books_dir
             if os.path.isfile(zip_filepath):
                 logging.info(f"Found valid book file: {filename}, Book ID: {book_id}")
-                chapters_count = process_book(es, zip_filepath, book_id)
+                chapters_count = process_book(
+                    es, zip_filepath, book_id, bulk_size=args.bulk_size
+                )
                 if chapters_count > 0:
                     total_books_processed += 1
                     total_chapters_ingested += chapters_count
@@ -1,6 +1,13 @@
+from itertools import islice
+
 from pydantic import BaseModel, Field
 
 
+def _chunk_start(chunk_range: str) -> int:
+    """first chunk of a summary key, e.g. 'c2-3' -> 2"""
+    return int(chunk_range.lstrip("c").split("-")[0])
+
+
 class EntityData(BaseModel):
     """
     Data format for an entity
@@ -18,3 +25,26 @@ class EntityData(BaseModel):
         default_factory=dict,
         description="List of relationships with other entities",
     )
+
+    def add_summary(self, chunk_range: str, text: str) -> None:
+        """
+        Add a summary, keeping `summary` ordered by its starting chunk.
+        Chunks are read in order, so this is normally an append.
+        """
+        in_order = (
+            chunk_range in self.summary
+            or not self.summary
+            or _chunk_start(chunk_range) >= _chunk_start(next(reversed(self.summary)))
+        )
+        self.summary[chunk_range] = text
+
+        if not in_order:
+            ordered = sorted(
+                self.summary.items(), key=lambda item: _chunk_start(item[0])
+            )
+            self.summary.clear()
+            self.summary.update(ordered)
+
+    def recent_summaries(self, count: int) -> list[str]:
+        """The latest `count` summary texts, oldest first."""
+        return list(islice(reversed(self.summary.values()), count))[::-1]
@@ -1,6 +1,14 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from string import Formatter
+
+import orjson
+
 from .llm.gemini import Gemini
 from .progress_buf import ProgressBuffer
 
+logger = logging.getLogger(__name__)
+
 
 class EmptyTextSourceError(Exception):
     """Exception raised when the text source is empty."""
@@ -16,6 +24,7 @@ class EntityExtractor:
     def __init__(self, book_id, cuhnk_length: int = 1):
         self.model: Gemini = Gemini()
         self.extract_prompt: str = self._get_prompt("./prompt/entity_extraction.txt")
+        self._prompt_segments = self._compile_prompt(self.extract_prompt)
 
         # book to read
         self.book_id: str = book_id
@@ -26,6 +35,10 @@ class EntityExtractor:
         # init elasticsearch client
         self.buffer = ProgressBuffer()
 
+        # reads the next chunk while the current one is with the model
+        self._prefetcher = ThreadPoolExecutor(max_workers=1)
+        self._prefetched: dict[int, Future] = {}
+
     def extract_entities(self, context: str, text: str) -> str:
         """
         prompts to AI to extract entities from the given text.
@@ -33,17 +46,47 @@ class EntityExtractor:
         return a json string with the extracted entities.
         """
 
-        prompt = self.extract_prompt.format(
-            context=context,
-            text=text,
-        )
+        prompt = self._build_prompt(context=context, text=text)
 
         raw_output = self.model.chat(prompt)
-        print(f"Raw output from model:\n{raw_output}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Raw output from model:\n{raw_output}")
         response = self.model.parse_response(raw_output)
 
         return response
 
+    def _build_prompt(self, **fields: str) -> list[str]:
+        """
+        Fills the placeholders of the compiled prompt.
+
+        The static instruction text is reused as is, only the variable
+        parts are sent as extra parts alongside it.
+        """
+        parts = []
+        for literal, field_name in self._prompt_segments:
+            if literal:
+                parts.append(literal)
+            if field_name and fields[field_name]:
+                parts.append(fields[field_name])
+        return parts
+
+    @staticmethod
+    def _compile_prompt(template: str) -> list[tuple[str, str | None]]:
+        """
+        Splits the prompt template into (static text, placeholder name) pairs.
+        Escaped braces are resolved here once instead of on every format call.
+        """
+        segments = []
+        literal = ""
+        for text, field_name, _, _ in Formatter().parse(template):
+            literal += text
+            if field_name is not None:
+                segments.append((literal, field_name))
+                literal = ""
+        if literal:
+            segments.append((literal, None))
+        return segments
+
     @staticmethod
     def _get_prompt(file_path: str) -> str:
         """
@@ -70,11 +113,32 @@ class EntityExtractor:
         """
         self.buffer.reset_progress(self.book_id)
 
-    def read(self, context: str) -> tuple[str, int, int]:
+    def _get_source_chunk(self, chunk_id: int) -> str:
+        """
+        Source text of a chunk, taken from the prefetched read if there is one.
+        """
+        future = self._prefetched.pop(chunk_id, None)
+        if future is not None:
+            return future.result()
+        return self.buffer.get_source_chunk(self.book_id, chunk_id)
+
+    def _prefetch_source_chunk(self, chunk_id: int) -> None:
+        """
+        Starts reading a chunk in the background, replacing any earlier prefetch.
+        """
+        self._prefetched = {
+            chunk_id: self._prefetcher.submit(
+                self.buffer.get_source_chunk, self.book_id, chunk_id
+            )
+        }
+
+    def read(self, context: str) -> tuple[list[dict], int, int]:
         """
         Reads the book in chunks and extracts entities from each chunk.
+
+        return the parsed entities and the chunk range they were read from.
         """
-        text = ""
+        sources: list[str] = []
 
         start_chunk_id = self.get_progress()
         print(f"Reading book {self.book_id} from chapter {start_chunk_id}")
@@ -83,25 +147,29 @@ class EntityExtractor:
 
             progress = self.get_progress()
 
-            new_source = self.buffer.get_source_chunk(self.book_id, progress)
+            new_source = self._get_source_chunk(progress)
             if new_source == "":
                 raise EmptyTextSourceError(
                     f"Empty text source for book {self.book_id} at chapter {progress}"
                 )
 
-            text += new_source
+            sources.append(new_source)
 
+        text = "".join(sources)
+        self._prefetch_source_chunk(progress + 1)
         print(f"Extracting entities from text: {text[:100]}...")
 
         response = self.extract_entities(context, text)
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError, callers still catch it
+        entities = orjson.loads(response)
 
         end_chunk_id = self.get_progress()
 
         self.buffer.save_entities_to_buffer(
-            self.book_id, response, start_chunk_id, end_chunk_id
+            self.book_id, entities, start_chunk_id, end_chunk_id
         )
 
-        return response, start_chunk_id, end_chunk_id
+        return entities, start_chunk_id, end_chunk_id
 
 
 def main():
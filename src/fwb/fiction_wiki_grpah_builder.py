@@ -1,6 +1,7 @@
 import json
 import logging
 import sys
+from collections import OrderedDict
 from typing import List
 
 from .entity_data import EntityData
@@ -11,6 +12,10 @@ from .wiki_graph import WikiGraph
 logging.basicConfig(level=logging.INFO)
 
 CONTEXT_SIZE = 10  # Number of recent summaries to include in context
+CONTEXT_CACHE_SIZE = 256  # Number of assembled entity contexts kept in memory
+
+# characters not allowed in relationship types, replaced with "_"
+RELATIONSHIP_SEPARATORS = str.maketrans(dict.fromkeys(", ;/&\\、", "_"))
 
 
 class FictionWikiGraphBuilder:
@@ -30,8 +35,13 @@ class FictionWikiGraphBuilder:
         self.reader = EntityExtractor(book_id)
 
         self.active_entities: List[EntityData] = []
+        self._active_names: set[str] = set()
+
+        # entity name -> assembled context fragment, least recently used first
+        self._context_fragments: OrderedDict[str, str] = OrderedDict()
 
-        self._llm = Gemini()
+        # share the extractor's model, one client and one set of error counts
+        self._llm: Gemini = self.reader.model
 
     def get_context(self, focused_entities: List[EntityData]) -> str:
         """get context from the text"""
@@ -39,122 +49,137 @@ class FictionWikiGraphBuilder:
         if not focused_entities:
             return ""
 
-        context = ""
+        # entity name -> cached fragment, misses are fetched in one query below
+        fragments: dict[str, str | None] = {}
 
         for node in focused_entities:
             if isinstance(node, EntityData):
-                entity_node = self.graph.get_entity_node(node.name)
-                if entity_node:
-                    summary_items = entity_node.summary.items()
-
-                    sorted_summary_items = sorted(
-                        summary_items,
-                        key=lambda item: int(item[0].lstrip("c").split("-")[0]),
-                    )
-
-                    recent_summary_texts = [
-                        text for key, text in sorted_summary_items[-CONTEXT_SIZE:]
-                    ]
-
-                    summary_text = "\n\n".join(recent_summary_texts)
-                    context += f"{entity_node.name}\n{summary_text}\n\n\n"
+                fragment = self._context_fragments.get(node.name)
+                if fragment is not None:
+                    self._context_fragments.move_to_end(node.name)
+                fragments[node.name] = fragment
 
             else:
                 raise ValueError("focused_entities should be a list of EntityData")
 
+        missing = [name for name, fragment in fragments.items() if fragment is None]
+        if missing:
+            for name, entity_node in self.graph.get_entity_nodes(missing).items():
+                fragments[name] = self._cache_context_fragment(entity_node)
+
+        context = "".join(fragment for fragment in fragments.values() if fragment)
         print(f"Context:\n{context[:500]}...")
         return context
 
-    def read_chunks(self, context: str) -> list[EntityData]:
-        """read chunks and return entities list"""
-
-        entities_str, start_chunk, end_chunk = self.reader.read(context)
+    def _cache_context_fragment(self, entity_node: EntityData) -> str:
+        """
+        assemble the context of an entity from its recent summaries
+        and keep it until the node is written again
+        """
+        recent_summary_texts = entity_node.recent_summaries(CONTEXT_SIZE)
 
-        if not entities_str:
-            return []
+        summary_text = "\n\n".join(recent_summary_texts)
+        fragment = f"{entity_node.name}\n{summary_text}\n\n\n"
 
-        try:
-            entities_json = json.loads(entities_str)
+        self._context_fragments[entity_node.name] = fragment
+        self._context_fragments.move_to_end(entity_node.name)
+        if len(self._context_fragments) > CONTEXT_CACHE_SIZE:
+            self._context_fragments.popitem(last=False)
 
-            # Chapter key format: 'c1' for chunk 1, 'c2-3' for chunks 2 to 3.
-            chunk_range_end = end_chunk - 1
-            chunk_range = f"c{start_chunk}"
-            if chunk_range_end > start_chunk:
-                chunk_range += f"-{chunk_range_end}"
+        return fragment
 
-            result_entities = []
-            for entity_payload in entities_json:
-                # The AI returns summary as a string. We pop it and handle it separately.
-                new_summary_text = entity_payload.pop("summary", "")
+    def read_chunks(self, context: str) -> list[EntityData]:
+        """read chunks and return entities list"""
 
-                # Create the EntityData object without the summary first
-                entity = EntityData(**entity_payload)
+        entities_json, start_chunk, end_chunk = self.reader.read(context)
 
-                # Now, add the summary with the chapter key
-                if new_summary_text:
-                    entity.summary[chunk_range] = new_summary_text
+        if not entities_json:
+            return []
 
-                result_entities.append(entity)
+        # Chapter key format: 'c1' for chunk 1, 'c2-3' for chunks 2 to 3.
+        chunk_range_end = end_chunk - 1
+        chunk_range = f"c{start_chunk}"
+        if chunk_range_end > start_chunk:
+            chunk_range += f"-{chunk_range_end}"
 
-            return result_entities
+        result_entities = []
+        for entity_payload in entities_json:
+            # The AI returns summary as a string, store it under the chapter key.
+            new_summary_text = entity_payload.pop("summary", "")
+            summary = {chunk_range: new_summary_text} if new_summary_text else {}
 
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON: {e}")
-            return []
+            result_entities.append(EntityData(**entity_payload, summary=summary))
 
-    def check_existing_entity(self, entity: EntityData) -> bool:
-        """check if the entity already exists in the graph"""
-        existing_node = self.graph.get_entity_node(entity.name)
-        if existing_node:
-            return True
-        return False
+        return result_entities
 
     def add_active_entities(self, entity: EntityData) -> None:
         """Add an entity to active entities list, ensuring uniqueness by name."""
         if not isinstance(entity, EntityData):
             raise ValueError("entities should be an instance of EntityData")
 
-        if not any(e.name == entity.name for e in self.active_entities):
+        if entity.name not in self._active_names:
             self.active_entities.append(entity)
+            self._active_names.add(entity.name)
             print(f"Added {entity.name} to active entities.")
         else:
             print(f"{entity.name} is already active, skipping addition.")
 
-    def create_or_update_node(self, entity: EntityData) -> None:
-        """create or merge a entity node in the graph"""
-        if not isinstance(entity, EntityData):
-            raise ValueError("entities should be an instance of EntityData")
-
-        if self.check_existing_entity(entity):
-            existing_node = self.graph.get_entity_node(entity.name)
-            existing_node.summary.update(entity.summary)
-            self.graph.update_entity_node(existing_node)
-            self.add_active_entities(existing_node)
-        else:
-            self.graph.add_entity_node(entity)
-            self.add_active_entities(entity)
+    def create_or_update_nodes(self, entities: List[EntityData]) -> None:
+        """
+        create or merge entity nodes in the graph
+        existing nodes are looked up and written in one batch each
+        """
+        for entity in entities:
+            if not isinstance(entity, EntityData):
+                raise ValueError("entities should be an instance of EntityData")
+
+        existing_nodes = self.graph.get_entity_nodes(
+            [entity.name for entity in entities]
+        )
+
+        # later duplicates and aliases in the same chunk merge into the same node
+        merged_nodes: dict[str, EntityData] = {}
+        for entity in entities:
+            node = self._merge_node(entity, existing_nodes.get(entity.name))
+            existing_nodes[entity.name] = node
+            merged_nodes[node.name] = node
+
+        self.graph.add_entity_nodes(list(merged_nodes.values()))
+
+        for node in merged_nodes.values():
+            self._cache_context_fragment(node)
+            self.add_active_entities(node)
+
+    def _merge_node(
+        self, entity: EntityData, existing_node: EntityData | None
+    ) -> EntityData:
+        """merge the entity into its stored node, return the node to write"""
+        if existing_node:
+            for chunk_range, summary_text in entity.summary.items():
+                existing_node.add_summary(chunk_range, summary_text)
+            return existing_node
+        return entity
 
     def link_relationship(self) -> None:
         """link relationships between entities"""
 
+        # only existence matters here, names are resolved without fetching nodes
+        existing_names = self.graph.get_canonical_names(
+            [entity.name for entity in self.active_entities]
+        )
+
+        edges: list[tuple[str, str, str]] = []
         for entity in self.active_entities:
-            if not self.graph.get_entity_node(entity.name):
+            if entity.name not in existing_names:
                 continue
 
             for node, relationship in entity.relationships.items():
-                parsed_rel = (
-                    relationship.replace(",", "_")
-                    .replace(" ", "_")
-                    .replace(";", "_")
-                    .replace("/", "_")
-                    .replace("&", "_")
-                    .replace("\\", "_")
-                    .replace("、", "_")
-                )
-                self.graph.add_edge(entity.name, node, parsed_rel)
-                print(
-                    f"Linked {entity.name} to {node} with relationship {relationship}"
-                )
+                parsed_rel = relationship.translate(RELATIONSHIP_SEPARATORS)
+                edges.append((entity.name, node, parsed_rel))
+
+        self.graph.add_edges(edges)
+        for source, target, relationship in edges:
+            print(f"Linked {source} to {target} with relationship {relationship}")
 
     def build_wiki(self) -> None:
         """build the wiki graph"""
@@ -181,17 +206,28 @@ class FictionWikiGraphBuilder:
                     print(f"Error decoding JSON: {e}")
                     continue
 
-            # clear active entities after context retrieved
+            # clear active entities after context retrieved,
+            # kept to be restored if the chunk is rolled back
+            previous_entities = self.active_entities
+            previous_names = self._active_names
             self.active_entities = []
+            self._active_names = set()
 
-            # new active entities is formed here
-            for entity in entities:
-                self.create_or_update_node(entity)
-
+            # one transaction per chunk, a failed link rolls back its nodes too
             try:
-                self.link_relationship()
+                with self.graph.batch():
+                    # new active entities is formed here
+                    self.create_or_update_nodes(entities)
+                    self.link_relationship()
             except Exception as e:
-                logging.error(f"Error linking relationships: {e}")
+                logging.error(f"Error writing chunk to the graph: {e}")
+                # fragments built from the rolled back summaries were never stored,
+                # the retry reads those nodes from the graph again
+                written_names = {entity.name for entity in entities}
+                for name in written_names | self._active_names:
+                    self._context_fragments.pop(name, None)
+                self.active_entities = previous_entities
+                self._active_names = previous_names
                 continue
 
             progress = self.reader.get_progress()
@@ -204,7 +240,12 @@ def main():
     graph = WikiGraph()
 
     builder = FictionWikiGraphBuilder(book_id, graph)
-    builder.build_wiki()
+    try:
+        builder.build_wiki()
+    finally:
+        print(f"LLM errors: {dict(builder.reader.model.error_counts)}")
+        builder.reader.buffer.close()
+        graph.close()
 
 
 if __name__ == "__main__":
@@ -1,10 +1,19 @@
+import functools
 import os
-import re
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING
 
-from google import genai
-from vertexai.preview import tokenization
+from pydantic import BaseModel
 
-model_codes = [
+# the SDKs are imported on first use, vertexai alone pulls in hundreds of modules
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
+
+model_codes = (
     # "gemini-2.5-pro-preview-03-25",  # not support for free tier now
     "gemini-2.5-flash-preview-05-20",
     "gemini-2.0-flash-thinking-exp-01-21",
@@ -15,69 +24,204 @@ model_codes = [
     "gemini-1.5-flash",
     "gemini-1.5-flash-8b",
     "gemma-3-27b-it",
-]
+)
+
+# model used for structured output
+structured_model_code = "gemini-1.5-pro-latest"
+
+MAX_ATTEMPTS = 5  # rounds over all models before giving up
+BACKOFF_INITIAL = 1.0  # seconds before the first retry round, doubled each round
+BACKOFF_MAX = 60.0
+RATE_LIMIT_THRESHOLD = 10  # consecutive 429 responses before pausing
+RATE_LIMIT_PAUSE = 60.0  # seconds
+RETRYABLE_CODES = (429, 500, 503, 504)
+SPECULATIVE_MODELS = 2  # models requested at once in speculative mode
+
+# local tokenizer used to count tokens
+tokenizer_model_code = "gemini-1.5-flash-002"
+
+
+@functools.lru_cache(maxsize=8)
+def _get_tokenizer(model_code: str):
+    """Load a tokenizer once, loading the SentencePiece model is expensive."""
+    from vertexai.preview import tokenization
 
-_tokenizer = tokenization.get_tokenizer_for_model("gemini-1.5-flash-002")
+    return tokenization.get_tokenizer_for_model(model_code)
 
-if not os.environ.get("GENAI_API_KEY"):
-    raise ValueError("GENAI_API_KEY environment variable is not set.")
-_api_key = os.environ["GENAI_API_KEY"]
 
-_model = genai.Client(api_key=_api_key)
+@functools.lru_cache(maxsize=1)
+def _client() -> "genai.Client":
+    """Create the Gemini client on first use, so importing needs no API key."""
+    from google import genai
+
+    api_key = os.environ.get("GENAI_API_KEY")
+    if not api_key:
+        raise ValueError("GENAI_API_KEY environment variable is not set.")
+    return genai.Client(api_key=api_key)
+
+
+def _structured_output_config(schema) -> "types.GenerateContentConfig":
+    """
+    The structured output config for `schema`.
+    Configs for schema classes are built once; dicts and types.Schema
+    instances are unhashable, so theirs are built on every call.
+    """
+    if isinstance(schema, type):
+        return _class_structured_output_config(schema)
+    return _build_structured_output_config(schema)
+
+
+@functools.lru_cache(maxsize=128)
+def _class_structured_output_config(schema: type) -> "types.GenerateContentConfig":
+    """Build the structured output config once per schema class."""
+    return _build_structured_output_config(schema)
+
+
+def _build_structured_output_config(schema) -> "types.GenerateContentConfig":
+    from google.genai import types
+
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=schema,
+    )
 
 
 class Gemini:
     def __init__(self):
-        pass
+        # error type name -> number of failed requests
+        self.error_counts: Counter[str] = Counter()
+        self._consecutive_rate_limits = 0
 
     def generate_structured_json(self, message: str, schema) -> str:
         """The model's response as a JSON string."""
         if not isinstance(message, str):
             raise ValueError("Message must be a string.")
 
-        for code in model_codes:
-            try:
-                # Use a model that supports structured output, like 1.5 Pro or Flash
-                model_to_use = "gemini-1.5-pro-latest"  # Or another suitable model
-
-                response = _model.models.generate_content(
-                    model=model_to_use,
-                    contents=message,
-                    config={
-                        "response_mime_type": "application/json",
-                        "response_schema": schema,
-                    },
-                )
-                return response.text
-            except Exception as e:
-                print(f"Error with model {code}: {e}")
-                continue
+        return self._generate(
+            (structured_model_code,),
+            contents=message,
+            config=_structured_output_config(schema),
+        )
 
-        raise RuntimeError("All models failed to generate content.")
+    def generate_structured(self, message: str, schema: type[BaseModel]) -> BaseModel:
+        """
+        The model's response validated into `schema`.
+        The JSON text is parsed by pydantic directly, without a json.loads pass.
+        """
+        response = self.generate_structured_json(message, schema)
+        return schema.model_validate_json(response)
 
     def token_count(self, text: str) -> int:
         """Count the number of tokens in a given text."""
         if not text:
             return 0
-        return _tokenizer.count_tokens(text).total_tokens
+        tokenizer = _get_tokenizer(tokenizer_model_code)
+        return tokenizer.count_tokens(text).total_tokens
 
-    def chat(self, message: str) -> str:
-        """Send a chat message to the Gemini model and return the response."""
-        if not isinstance(message, str):
-            raise ValueError("Message must be a string.")
+    def token_counts(self, texts: list[str]) -> list[int]:
+        """Count the tokens of several texts with a single tokenizer call."""
+        non_empty = [text for text in texts if text]
+        if not non_empty:
+            return [0] * len(texts)
+
+        tokenizer = _get_tokenizer(tokenizer_model_code)
+        tokens_info = iter(tokenizer.compute_tokens(non_empty).tokens_info)
+        return [len(next(tokens_info).token_ids) if text else 0 for text in texts]
 
-        for code in model_codes:
+    def chat(self, message: str | list[str], speculative: bool = False) -> str:
+        """
+        Send a chat message to the Gemini model and return the response.
+        A list of strings is sent as the parts of a single message.
+
+        With speculative=True the models are requested in pairs and the first
+        answer wins, trading quota for latency when models are failing.
+        """
+        if not isinstance(message, (str, list)):
+            raise ValueError("Message must be a string or a list of strings.")
+
+        return self._generate(model_codes, speculative=speculative, contents=message)
+
+    def _generate(
+        self, codes: tuple[str, ...], speculative: bool = False, **kwargs
+    ) -> str:
+        """
+        Try the models in order. When all of them fail with transient errors,
+        back off exponentially with jitter and try them again.
+        """
+        group_size = SPECULATIVE_MODELS if speculative else 1
+
+        for attempt in range(MAX_ATTEMPTS):
+            retryable = False
+            for i in range(0, len(codes), group_size):
+                for code, outcome in self._request(codes[i : i + group_size], **kwargs):
+                    if isinstance(outcome, Exception):
+                        print(f"Error with model {code}: {outcome}")
+                        retryable = self._record_error(outcome) or retryable
+                    else:
+                        self._consecutive_rate_limits = 0
+                        return outcome.text
+
+            if not retryable or attempt == MAX_ATTEMPTS - 1:
+                break
+
+            delay = min(BACKOFF_MAX, BACKOFF_INITIAL * 2**attempt + random.random())
+            print(f"All models failed, retrying in {delay:.1f} seconds.")
+            time.sleep(delay)
+
+        raise RuntimeError("All models failed to generate content.")
+
+    @staticmethod
+    def _request(codes: tuple[str, ...], **kwargs):
+        """
+        Send the request to every model at once.
+        Yields (model, response or error) in the order they finish.
+        """
+        if len(codes) == 1:
             try:
-                response = _model.models.generate_content(
-                    model=code,
-                    contents=message,
+                yield codes[0], _client().models.generate_content(
+                    model=codes[0], **kwargs
                 )
-                return response.text
             except Exception as e:
-                print(f"Error with model {code}: {e}")
-                continue
+                yield codes[0], e
+            return
 
-        raise RuntimeError("All models failed to generate content.")
+        def generate(code: str):
+            # the client is resolved in the worker, so a missing API key is
+            # yielded as that model's error like on the serial path
+            return _client().models.generate_content(model=code, **kwargs)
+
+        executor = ThreadPoolExecutor(max_workers=len(codes))
+        futures = {executor.submit(generate, code): code for code in codes}
+        try:
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    yield futures[future], e
+        finally:
+            # a running request cannot be cancelled, its result is dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _record_error(self, error: Exception) -> bool:
+        """Count a failed request, return whether it is worth retrying."""
+        from google.genai import errors
+
+        self.error_counts[type(error).__name__] += 1
+
+        if not isinstance(error, errors.APIError):
+            return False
+
+        if error.code == 429:
+            self._consecutive_rate_limits += 1
+            if self._consecutive_rate_limits >= RATE_LIMIT_THRESHOLD:
+                print(
+                    f"{self._consecutive_rate_limits} rate limit errors in a row, "
+                    f"pausing for {RATE_LIMIT_PAUSE} seconds."
+                )
+                time.sleep(RATE_LIMIT_PAUSE)
+                self._consecutive_rate_limits = 0
+
+        return error.code in RETRYABLE_CODES
 
     def parse_response(self, response: str) -> str:
         """remove the markdown code block"""
@@ -85,21 +229,21 @@ class Gemini:
             if not response:
                 return ""
 
-            # Regular expression to find a JSON block, supporting both ```json and ```
-            # It captures the content between the backticks.
-            # re.DOTALL flag allows '.' to match newline characters.
-            pattern = r"```json\s*\n?(.*?)\n?\s*```"
-
-            match = re.search(pattern, response, re.DOTALL)
-
-            if match:
-                # If a markdown block is found, return its content, stripped of whitespace.
-                return match.group(1).strip()
-            else:
+            # Find a ```json block and return its content, stripped of whitespace.
+            # Plain str.find locates the fences without running a regex over
+            # the whole response.
+            start = response.find("```json")
+            if start == -1:
                 # If no markdown block is found, assume the entire response is the JSON string.
-                # This maintains the original behavior for plain JSON responses.
                 return response.strip()
 
+            start += len("```json")
+            end = response.find("```", start)
+            if end == -1:
+                return response.strip()
+
+            return response[start:end].strip()
+
         except Exception as e:
             print(f"Error parsing response: {e}")
             return ""
@@ -2,13 +2,15 @@
 # This version stores all data for a book (progress and entities)
 # in a dedicated subdirectory within the data directory.
 
-import json
 import os
+import threading
 import uuid
 import zipfile
 from datetime import datetime
 from pathlib import Path
 
+import orjson
+
 
 class ProgressBuffer:
     """progress tracking and entities storage"""
@@ -18,136 +20,259 @@ class ProgressBuffer:
         self.books_dir = Path(books_dir)
         self.data_dir = Path(data_dir)
 
+        # book id -> data directory, created on first use
+        self._book_data_dirs: dict[str, Path] = {}
+
+        # book id -> reading progress, written through to progress.txt
+        self._progress_cache: dict[str, int] = {}
+        self._progress_lock = threading.Lock()
+
+        # serializes appends to a book's entities file
+        self._buffer_locks: dict[str, threading.Lock] = {}
+        self._buffer_locks_guard = threading.Lock()
+
+        # book id -> (zip mtime_ns and size, open source zip,
+        #             its chapter files by basename, number of chunks)
+        self._zip_cache: dict[
+            str,
+            tuple[tuple[int, int], zipfile.ZipFile, dict[str, zipfile.ZipInfo], int],
+        ] = {}
+        self._zip_lock = threading.Lock()
+
     def _get_book_data_dir(self, book_id: str) -> Path:
         """e.g. .fwb_data/10147/"""
-        book_data_path = self.data_dir / str(book_id)
-        book_data_path.mkdir(parents=True, exist_ok=True)
+        book_data_path = self._book_data_dirs.get(str(book_id))
+        if book_data_path is None:
+            book_data_path = self.data_dir / str(book_id)
+            book_data_path.mkdir(parents=True, exist_ok=True)
+            self._book_data_dirs[str(book_id)] = book_data_path
         return book_data_path
 
+    def _get_entities_path(self, book_id: str) -> Path:
+        """e.g. .fwb_data/10147/entities.jsonl, one entity document per line"""
+        return self._get_book_data_dir(book_id) / "entities.jsonl"
+
+    def _get_buffer_lock(self, book_id: str) -> threading.Lock:
+        """lock guarding the entities file of a book"""
+        with self._buffer_locks_guard:
+            return self._buffer_locks.setdefault(str(book_id), threading.Lock())
+
     def _get_source_zip_path(self, book_id: str) -> Path:
         """Get the file path for the book's source zip file."""
         return self.books_dir / f"book_{book_id}.zip"
 
+    def _get_zip(
+        self, book_id: str
+    ) -> tuple[zipfile.ZipFile, dict[str, zipfile.ZipInfo], int] | None:
+        """
+        Open the book's source zip once, index its .txt members by basename
+        and count its chunks. Reopened if the zip changes on disk.
+        Returns None if the zip is missing or unreadable.
+        """
+        book_id = str(book_id)
+        zip_path = self._get_source_zip_path(book_id)
+        try:
+            zip_stat = os.stat(zip_path)
+        except OSError:
+            return None
+        signature = (zip_stat.st_mtime_ns, zip_stat.st_size)
+
+        with self._zip_lock:
+            cached = self._zip_cache.get(book_id)
+            if cached is not None:
+                if cached[0] == signature:
+                    return cached[1:]
+                del self._zip_cache[book_id]
+                cached[1].close()
+
+            try:
+                zf = zipfile.ZipFile(zip_path, "r")
+            except (FileNotFoundError, IsADirectoryError, zipfile.BadZipFile):
+                return None
+
+            index = {}
+            for member_info in zf.infolist():
+                if not member_info.is_dir() and member_info.filename.endswith(".txt"):
+                    basename = os.path.basename(member_info.filename)
+                    index.setdefault(basename, member_info)
+            length = sum(1 for basename in index if basename[:-4].isdigit())
+
+            self._zip_cache[book_id] = (signature, zf, index, length)
+            return zf, index, length
+
+    def close(self) -> None:
+        """close the cached source zip files"""
+        with self._zip_lock:
+            for _, zf, _, _ in self._zip_cache.values():
+                zf.close()
+            self._zip_cache.clear()
+
     def get_source_chunk(self, book_id: str, chunk_id: int) -> str:
         """Retrieve a specific chapter from the book's zip file."""
-        zip_path = self._get_source_zip_path(book_id)
-        target_basename = f"{chunk_id}.txt"
+        for attempt in range(2):
+            source = self._get_zip(book_id)
+            if source is None:
+                return ""
 
-        if not zip_path.is_file():
-            return ""
+            zf, index, _ = source
+            member_info = index.get(f"{chunk_id}.txt")
+            if member_info is None:
+                return ""
 
-        try:
-            with zipfile.ZipFile(zip_path, "r") as zf:
-                for member_info in zf.infolist():
-                    if (
-                        not member_info.is_dir()
-                        and os.path.basename(member_info.filename) == target_basename
-                    ):
-                        with zf.open(member_info.filename) as chapter_file:
-                            return chapter_file.read().decode("utf-8", errors="ignore")
+            try:
+                with zf.open(member_info) as chapter_file:
+                    return chapter_file.read().decode("utf-8", errors="ignore")
+            except (FileNotFoundError, zipfile.BadZipFile):
+                # e.g. a corrupted member failing its CRC check
                 return ""
-        except (FileNotFoundError, zipfile.BadZipFile):
-            return ""
+            except ValueError:
+                # another thread closed this handle when the zip changed on disk,
+                # retry once with the reopened one
+                if attempt:
+                    raise
+        return ""
 
     ## Save and retrieve reading progress for a book
     def save_progress(self, book_id: str, progress: int) -> None:
         """Save the reading progress for a book to 'progress.txt'."""
-        book_data_dir = self._get_book_data_dir(book_id)
-        progress_file = book_data_dir / "progress.txt"
-        with open(progress_file, "w", encoding="utf-8") as f:
-            f.write(str(progress))
+        with self._progress_lock:
+            if self._progress_cache.get(str(book_id)) == progress:
+                return
+
+            book_data_dir = self._get_book_data_dir(book_id)
+            progress_file = book_data_dir / "progress.txt"
+            # write a temp file and swap it in, a crash never leaves it truncated
+            tmp_file = book_data_dir / "progress.txt.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.write(str(progress))
+            os.replace(tmp_file, progress_file)
+            self._progress_cache[str(book_id)] = progress
 
     def get_progress(self, book_id: str) -> int:
-        """Retrieve the reading progress from 'progress.txt'."""
-        book_data_dir = self._get_book_data_dir(book_id)
-        progress_file = book_data_dir / "progress.txt"
-        try:
-            with open(progress_file, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-                return int(content) if content else 1
-        except (FileNotFoundError, ValueError):
-            return 1
+        """Retrieve the reading progress, read from 'progress.txt' once."""
+        with self._progress_lock:
+            progress = self._progress_cache.get(str(book_id))
+            if progress is not None:
+                return progress
+
+            book_data_dir = self._get_book_data_dir(book_id)
+            progress_file = book_data_dir / "progress.txt"
+            try:
+                with open(progress_file, "r", encoding="utf-8") as f:
+                    content = f.read().strip()
+                    progress = int(content) if content else 1
+            except (FileNotFoundError, ValueError):
+                return 1
+
+            self._progress_cache[str(book_id)] = progress
+            return progress
 
     def reset_progress(self, book_id: str) -> None:
         """Reset the reading progress by deleting 'progress.txt'."""
-        book_data_dir = self._get_book_data_dir(book_id)
-        progress_file = book_data_dir / "progress.txt"
-        try:
-            os.remove(progress_file)
-        except FileNotFoundError:
-            pass
+        with self._progress_lock:
+            self._progress_cache.pop(str(book_id), None)
+
+            book_data_dir = self._get_book_data_dir(book_id)
+            progress_file = book_data_dir / "progress.txt"
+            try:
+                os.remove(progress_file)
+            except FileNotFoundError:
+                pass
 
     ## Save and retrieve entities in the buffer for a book
     def save_entities_to_buffer(
-        self, book_id: str, entities: str, starting_chunk_id: int, end_chunk_id: int
+        self,
+        book_id: str,
+        entities: str | list[dict],
+        starting_chunk_id: int,
+        end_chunk_id: int,
     ) -> None:
-        """save entities as json"""
-        book_data_dir = self._get_book_data_dir(book_id)
-        entity_list = json.loads(entities) if isinstance(entities, str) else entities
+        """append entities to the book's entities file, one json per line"""
+        entity_list = orjson.loads(entities) if isinstance(entities, str) else entities
+        # one timestamp for the whole batch, they are saved together
+        timestamp = datetime.now().isoformat()
 
+        lines = []
         for entity in entity_list:
-            entity_id = str(uuid.uuid4())
             doc = {
-                "entity_id": entity_id,
+                "entity_id": str(uuid.uuid4()),
                 "entity": entity,
                 "starting_chunk_id": starting_chunk_id,
                 "end_chunk_id": end_chunk_id,
-                "@timestamp": datetime.now().isoformat(),
+                "@timestamp": timestamp,
             }
-            # Save each entity document as its own JSON file
-            entity_file_path = book_data_dir / f"{entity_id}.json"
-            with open(entity_file_path, "w") as f:
-                json.dump(doc, f, indent=2, ensure_ascii=False)
+            lines.append(orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE))
+
+        if not lines:
+            return
+
+        entities_path = self._get_entities_path(book_id)
+        with self._get_buffer_lock(book_id):
+            with open(entities_path, "ab") as f:
+                f.write(b"".join(lines))
+
+    @staticmethod
+    def _get_legacy_entity_files(book_data_dir: Path) -> list[str]:
+        """paths of the per-entity .json files written by earlier versions"""
+        with os.scandir(book_data_dir) as entries:
+            return [
+                entry.path
+                for entry in entries
+                if entry.name.endswith(".json") and entry.is_file(follow_symlinks=False)
+            ]
 
     def get_entities_from_buffer(self, book_id: str) -> list[dict]:
-        """Retrieve all entities by reading all .json files from the book's data directory."""
+        """Retrieve all entities saved in the buffer of a book."""
         book_data_dir = self._get_book_data_dir(book_id)
-
-        if not book_data_dir.exists():
-            return []
+        entities_path = self._get_entities_path(book_id)
 
         all_entities = []
-        for file_path in book_data_dir.glob("*.json"):
+        try:
+            with open(entities_path, "rb") as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        all_entities.append(orjson.loads(line))
+                    except orjson.JSONDecodeError:
+                        print(
+                            f"Error reading {entities_path}:{line_number}: skipping line."
+                        )
+        except FileNotFoundError:
+            pass
+
+        for file_path in self._get_legacy_entity_files(book_data_dir):
             try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    all_entities.append(json.load(f))
-            except (json.JSONDecodeError, IOError):
+                with open(file_path, "rb") as f:
+                    all_entities.append(orjson.loads(f.read()))
+            except (orjson.JSONDecodeError, IOError):
                 print(f"Error reading {file_path}: skipping file.")
                 # Ignore corrupted or unreadable files
                 pass
         return all_entities
 
     def clear_buffer(self, book_id: str) -> None:
-        """remove all json files"""
+        """remove the saved entities of a book"""
         book_data_dir = self._get_book_data_dir(book_id)
-        if not book_data_dir.exists():
-            return
 
-        for file_path in book_data_dir.glob("*.json"):
+        with self._get_buffer_lock(book_id):
             try:
-                os.remove(file_path)
+                os.remove(self._get_entities_path(book_id))
+            except FileNotFoundError:
+                pass
+
+        for file_path in self._get_legacy_entity_files(book_data_dir):
+            try:
+                os.unlink(file_path)
             except OSError:
                 # Ignore errors if file is already gone
                 pass
 
     def get_book_length(self, book_id: str) -> int:
         """get the number of chunks in total"""
-        zip_path = self._get_source_zip_path(book_id)
-
-        if not zip_path.is_file():
+        source = self._get_zip(book_id)
+        if source is None:
             return 0
 
-        try:
-            with zipfile.ZipFile(zip_path, "r") as zf:
-                count = 0
-                for member_info in zf.infolist():
-                    if not member_info.is_dir() and member_info.filename.endswith(
-                        ".txt"
-                    ):
-                        basename = os.path.basename(member_info.filename)
-                        filename_no_ext = os.path.splitext(basename)[0]
-                        if filename_no_ext.isdigit():
-                            count += 1
-                return count
-        except (FileNotFoundError, zipfile.BadZipFile):
-            return 0
+        _, _, length = source
+        return length
@@ -1,7 +1,19 @@
+import functools
 import json
-from collections import deque
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Iterator, TypeVar
 
-from neo4j import GraphDatabase
+from neo4j import (
+    Driver,
+    GraphDatabase,
+    ManagedTransaction,
+    Record,
+    Session,
+    Transaction,
+)
+from neo4j.exceptions import ClientError, DatabaseError
 
 from .entity_data import EntityData
 
@@ -9,219 +21,684 @@ uri = "neo4j://localhost:7687"
 # username = "neo4j"
 # password = "P@ssw0rd"
 
+# connection pool defaults, sized for a few concurrent workers per process
+MAX_CONNECTION_POOL_SIZE = 50
+CONNECTION_ACQUISITION_TIMEOUT = 60.0  # seconds to wait for a free connection
+MAX_CONNECTION_LIFETIME = 3600.0  # seconds before a pooled connection is replaced
+
+T = TypeVar("T")
+
+ENTITY_CACHE_SIZE = 10_000  # Number of entity nodes kept in memory per WikiGraph
+TEMPLATE_QUERY_CACHE_SIZE = 256  # Number of formatted edge type queries kept
+
+# one driver (and connection pool) per configuration, shared by WikiGraph instances,
+# with the number of open instances using it; closed when the last one closes
+_DriverKey = tuple[str, int, float, float]
+_DRIVERS: dict[_DriverKey, Driver] = {}
+_DRIVER_REFS: dict[_DriverKey, int] = {}
+_DRIVERS_LOCK = threading.Lock()
+
+
+def _get_driver(key: _DriverKey) -> Driver:
+    """acquire the shared driver for these settings, created and verified on first
+    use; every call must be paired with a `_release_driver`"""
+    (
+        uri,
+        max_connection_pool_size,
+        connection_acquisition_timeout,
+        max_connection_lifetime,
+    ) = key
+    with _DRIVERS_LOCK:
+        driver = _DRIVERS.get(key)
+        if driver is None:
+            driver = GraphDatabase.driver(
+                uri,
+                max_connection_pool_size=max_connection_pool_size,
+                connection_acquisition_timeout=connection_acquisition_timeout,
+                max_connection_lifetime=max_connection_lifetime,
+                keep_alive=True,
+            )
+            driver.verify_connectivity()
+            _DRIVERS[key] = driver
+        _DRIVER_REFS[key] = _DRIVER_REFS.get(key, 0) + 1
+        return driver
+
+
+def _release_driver(key: _DriverKey) -> None:
+    """release a driver from `_get_driver`, closing it if nothing else uses it"""
+    with _DRIVERS_LOCK:
+        _DRIVER_REFS[key] -= 1
+        if _DRIVER_REFS[key] > 0:
+            return
+        del _DRIVER_REFS[key]
+        driver = _DRIVERS.pop(key)
+    driver.close()
+
+
+# Cypher queries, kept as constants so every call sends the identical string
+# backs every {name: ...} lookup with an index seek and keeps MERGE from duplicating
+CREATE_NAME_CONSTRAINT_QUERY = """
+CREATE CONSTRAINT entity_name_unique IF NOT EXISTS
+FOR (n:Entity) REQUIRE n.name IS UNIQUE
+"""
+
+ADD_ENTITIES_QUERY = """
+UNWIND $rows AS row
+MERGE (n:Entity {name: row.name})
+SET n.category = row.category,
+    n.summary = row.summary
+RETURN elementid(n), EXISTS { (n)-[:ALIAS]->(:Entity) } AS is_alias
+"""
+
+UPDATE_ENTITY_QUERY = """
+MATCH (n:Entity {name: $name})
+SET n.category = $category,
+    n.summary = $summary
+"""
+
+CREATE_ALIAS_QUERY = """
+MATCH (a:Entity {name: $node_a}), (b:Entity {name: $node_b})
+MERGE (b)-[:ALIAS]->(a)
+"""
+
+# resolves each name to its canonical node (if the name is an alias)
+# then returns properties of that canonical node, keyed by the input name
+GET_ENTITIES_QUERY = """
+UNWIND $names AS input
+MATCH (n_input:Entity {name: input})
+OPTIONAL MATCH (n_input)-[:ALIAS]->(aliased_to:Entity)
+WITH input, coalesce(aliased_to, n_input) AS resolved_node
+RETURN input,
+       resolved_node.name AS name,
+       resolved_node.category AS category,
+       resolved_node.summary AS summary
+"""
+
+# resolves each name to its canonical node's name without reading its properties
+GET_CANONICAL_NAMES_QUERY = """
+UNWIND $names AS input
+MATCH (n:Entity {name: input})
+OPTIONAL MATCH (n)-[:ALIAS]->(aliased_to:Entity)
+RETURN input, coalesce(aliased_to.name, n.name) AS name
+"""
+
+DELETE_NODE_QUERY = """
+MATCH (n:Entity {name: $name})
+DETACH DELETE n
+"""
+
+# deletes in batches of 10000 nodes, each committed on its own so memory stays
+# bounded; CALL IN TRANSACTIONS only runs in an auto-commit query
+CLEAR_ALL_QUERY = """
+MATCH (n)
+CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS
+"""
+
+GET_EDGES_OUTGOING_QUERY = """
+MATCH (n:Entity {name: $node_name})-[r]->(m)
+RETURN type(r) AS edge_type, m.name AS target_node
+"""
+
+GET_EDGES_IN_QUERY = """
+MATCH (m)-[r]->(n:Entity {name: $node_name})
+RETURN type(r) AS edge_type, m.name AS source_node
+"""
+
+GET_EDGE_ATOB_QUERY = """
+MATCH (a:Entity {name: $node_a})-[r]->(b:Entity {name: $node_b})
+RETURN type(r) AS edge_type
+"""
+
+DELETE_EDGE_QUERY = """
+MATCH (a:Entity {name: $source})-[r]->(b:Entity {name: $target})
+DELETE r
+"""
+
+# EXISTS stops at the first matching edge instead of counting them all
+IS_EDGE_EXISTS_QUERY = """
+RETURN EXISTS {
+    MATCH (:Entity {name: $source})-->(:Entity {name: $target})
+} AS edge_exists
+"""
+
+GET_CATEGORIES_QUERY = """
+OPTIONAL MATCH (n:Entity)
+WHERE n.category IS NOT NULL
+RETURN collect(DISTINCT n.category) AS categories
+"""
+
+# relationship types cannot be parameters in plain Cypher, without APOC
+# these templates are formatted per edge type, see `_template_query`
+ADD_EDGES_TEMPLATE = """
+UNWIND $pairs AS pair
+MATCH (a:Entity {name: pair.source}), (b:Entity {name: pair.target})
+MERGE (a)-[r:%s]->(b)
+"""
+
+# replace edges of other types and merge the new one in one round trip
+UPDATE_EDGE_TEMPLATE = """
+MATCH (a:Entity {name: $source}), (b:Entity {name: $target})
+OPTIONAL MATCH (a)-[old]->(b)
+WHERE type(old) <> $edge_type
+DELETE old
+WITH DISTINCT a, b
+MERGE (a)-[r:%s]->(b)
+"""
+
+# with APOC the relationship type is a parameter, one query text covers all types
+ADD_EDGES_APOC_QUERY = """
+UNWIND $edges AS edge
+MATCH (a:Entity {name: edge.source}), (b:Entity {name: edge.target})
+CALL apoc.merge.relationship(a, edge.edge_type, {}, {}, b, {}) YIELD rel
+RETURN count(rel)
+"""
+
+UPDATE_EDGE_APOC_QUERY = """
+MATCH (a:Entity {name: $source}), (b:Entity {name: $target})
+OPTIONAL MATCH (a)-[old]->(b)
+WHERE type(old) <> $edge_type
+DELETE old
+WITH DISTINCT a, b
+CALL apoc.merge.relationship(a, $edge_type, {}, {}, b, {}) YIELD rel
+RETURN count(rel)
+"""
+
+# server-side BFS; uniqueness defaults to NODE_GLOBAL, minLevel 0 keeps the start
+BFS_APOC_QUERY = """
+MATCH (s:Entity {name: $name})
+CALL apoc.path.subgraphNodes(s, {maxLevel: $depth, relationshipFilter: '>', bfs: true})
+YIELD node
+RETURN node.name AS name
+"""
+
+# fails with ProcedureNotFound when APOC is not installed
+APOC_CHECK_QUERY = "CALL apoc.help('apoc')"
+
+# fallback when APOC is not installed: expand one BFS level per query,
+# visiting each node once instead of enumerating every variable-length path
+BFS_START_QUERY = """
+MATCH (s:Entity {name: $name})
+RETURN s.name AS name
+"""
+
+BFS_LEVEL_QUERY = """
+UNWIND $frontier AS frontier_name
+MATCH (:Entity {name: frontier_name})-->(m)
+RETURN DISTINCT m.name AS name
+"""
+
+
+# edge types are free text from the extractor, not a fixed set, so only the
+# recently used ones are kept
+@functools.lru_cache(maxsize=TEMPLATE_QUERY_CACHE_SIZE)
+def _template_query(template: str, value: str) -> str:
+    """format a query template and reuse the same string for repeated values,
+    the value is backtick quoted so it cannot break out of the type name"""
+    quoted = "`" + value.replace("`", "``") + "`"
+    return template % quoted
+
+
+def _copy_entity(entity_node: EntityData) -> EntityData:
+    """copy of a stored node, callers may add summaries to it"""
+    return EntityData.model_construct(
+        name=entity_node.name,
+        category=entity_node.category,
+        summary=dict(entity_node.summary),
+    )
+
 
 class WikiGraph:
     """operation related to graph storage"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        max_connection_pool_size: int = MAX_CONNECTION_POOL_SIZE,
+        connection_acquisition_timeout: float = CONNECTION_ACQUISITION_TIMEOUT,
+        max_connection_lifetime: float = MAX_CONNECTION_LIFETIME,
+    ):
         """Initialize the GraphStorage instance."""
-        self.graph = GraphDatabase.driver(uri)
+        self._driver_key: _DriverKey | None = (
+            uri,
+            max_connection_pool_size,
+            connection_acquisition_timeout,
+            max_connection_lifetime,
+        )
+        self.graph = _get_driver(self._driver_key)
+
+        # one session per thread, reused across calls; sessions are not thread safe
+        self._local = threading.local()
+        self._sessions: list[Session] = []
+        self._sessions_lock = threading.Lock()
+
+        # None until the first call that can use APOC checks whether it is installed
+        self._has_apoc: bool | None = None
+
+        # canonical name -> stored entity, least recently used first,
+        # and input name -> canonical name for the names looked up so far
+        self._entity_cache: OrderedDict[str, EntityData] = OrderedDict()
+        self._canonical_names: dict[str, str] = {}
+        self._cache_lock = threading.Lock()
+
+        try:
+            self._create_constraints()
+        except BaseException:
+            # the shared driver was acquired above, release it
+            self.close()
+            raise
+
+    def _create_constraints(self) -> None:
+        """create the schema constraints the queries rely on, if missing"""
+        with self._session() as session:
+            try:
+                session.run(CREATE_NAME_CONSTRAINT_QUERY).consume()
+            except (ClientError, DatabaseError) as e:
+                # e.g. duplicate names already stored (ConstraintCreationFailed,
+                # a DatabaseError), lookups fall back to scans
+                print(f"Could not create the Entity name constraint: {e.message}")
+
+    @contextmanager
+    def _session(self) -> Iterator[Session | Transaction]:
+        """
+        the calling thread's session, opened on first use and kept open,
+        or its open transaction while inside `batch()`
+        """
+        tx = getattr(self._local, "tx", None)
+        if tx is not None:
+            yield tx
+            return
+
+        session = getattr(self._local, "session", None)
+        if session is None or session.closed():
+            session = self.graph.session()
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        yield session
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Run the calling thread's graph operations in one transaction,
+        committed on exit and rolled back on error. Nested batches join the
+        outer one.
+        """
+        if getattr(self._local, "tx", None) is not None:
+            yield
+            return
+
+        with self._session() as session:
+            try:
+                with session.begin_transaction() as tx:
+                    self._local.tx = tx
+                    yield
+                    tx.commit()
+            except BaseException:
+                # cached writes of the rolled back transaction are stale
+                self._clear_entity_cache()
+                raise
+            finally:
+                self._local.tx = None
+
+    def _apoc_available(self) -> bool:
+        """check for APOC in a separate session, a failed probe would abort a batch"""
+        with self.graph.session() as session:
+            try:
+                session.run(APOC_CHECK_QUERY).consume()
+            except ClientError as e:
+                if e.code != "Neo.ClientError.Procedure.ProcedureNotFound":
+                    raise
+                return False
+        return True
+
+    def _uses_apoc(self) -> bool:
+        """whether APOC procedures are installed, checked once"""
+        if self._has_apoc is None:
+            self._has_apoc = self._apoc_available()
+        return self._has_apoc
+
+    def _cached_entity(self, name: str) -> EntityData | None:
+        """the cached node `name` resolves to, or None if it is not cached"""
+        with self._cache_lock:
+            canonical_name = self._canonical_names.get(name)
+            if canonical_name is None:
+                return None
+            entity_node = self._entity_cache.get(canonical_name)
+            if entity_node is not None:
+                self._entity_cache.move_to_end(canonical_name)
+            return entity_node
+
+    def _cache_entity(self, entity_node: EntityData, name: str | None = None) -> None:
+        """store a copy of the node, and that `name` resolves to it if given"""
+        with self._cache_lock:
+            if name is not None:
+                if len(self._canonical_names) >= ENTITY_CACHE_SIZE:
+                    self._canonical_names.clear()
+                self._canonical_names[name] = entity_node.name
+            self._entity_cache[entity_node.name] = _copy_entity(entity_node)
+            self._entity_cache.move_to_end(entity_node.name)
+            if len(self._entity_cache) > ENTITY_CACHE_SIZE:
+                self._entity_cache.popitem(last=False)
 
-        self.graph.verify_connectivity()
+    def _clear_entity_cache(self) -> None:
+        """forget all cached nodes and alias resolutions"""
+        with self._cache_lock:
+            self._entity_cache.clear()
+            self._canonical_names.clear()
+
+    def _transact(
+        self,
+        work: Callable[[ManagedTransaction | Transaction], T],
+        write: bool = False,
+    ) -> T:
+        """
+        run `work(tx)` in a managed transaction, which the driver retries on
+        transient errors; inside `batch()` it runs in the batch's transaction
+        """
+        with self._session() as session:
+            if isinstance(session, Transaction):
+                return work(session)
+            if write:
+                return session.execute_write(work)
+            return session.execute_read(work)
+
+    def _stream(self, query: str, **params) -> Iterator[Record]:
+        """
+        yield the records of a read query as they arrive; outside `batch()` it
+        runs on a session of its own, a transaction begun on the thread's
+        session would consume the rest of a partly read result and drop it
+        """
+        tx = getattr(self._local, "tx", None)
+        if tx is not None:
+            yield from tx.run(query, params)
+            return
+
+        with self.graph.session() as session:
+            yield from session.run(query, params)
+
+    def _read(self, query: str, **params) -> list[Record]:
+        """all records of a read query, see `_transact`"""
+        return self._transact(lambda tx: list(tx.run(query, params)))
+
+    def _write(self, query: str, **params) -> list[Record]:
+        """all records of a write query, see `_transact`"""
+        return self._transact(lambda tx: list(tx.run(query, params)), write=True)
 
     def close(self) -> None:
         """Close the connection to the Neo4j database."""
-        if self.graph:
-            self.graph.close()
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+        # the driver is shared, it is only closed once every user has closed
+        if self._driver_key is not None:
+            _release_driver(self._driver_key)
+            self._driver_key = None
 
-    def add_entity_node(self, entity_data: EntityData) -> int:
-        """Add an entity node to the graph"""
-        with self.graph.session() as session:
-            query = """
-            MERGE (n:Entity {name: $name})
-            SET n.category = $category,
-                n.summary = $summary
-            RETURN elementid(n)
-            """
-            summary_json = json.dumps(entity_data.summary)
-            result = session.run(
-                query,
-                name=entity_data.name,
-                category=entity_data.category,
-                summary=summary_json,  # Pass the JSON string
+    def add_entity_node(self, entity_data: EntityData) -> str:
+        """Add an entity node to the graph, return its element id"""
+        return self.add_entity_nodes([entity_data])[0]
+
+    def add_entity_nodes(self, entities: list[EntityData]) -> list[str]:
+        """Add or update entity nodes in a single query, return their element ids."""
+        if not entities:
+            return []
+
+        rows = [
+            {
+                "name": entity_data.name,
+                "category": entity_data.category,
+                "summary": json.dumps(entity_data.summary),
+            }
+            for entity_data in entities
+        ]
+        records = self._write(ADD_ENTITIES_QUERY, rows=rows)
+
+        for entity_data, record in zip(entities, records):
+            # a node without an ALIAS edge resolves to itself
+            self._cache_entity(
+                entity_data, None if record["is_alias"] else entity_data.name
             )
-            node_id = result.single()[0]
-            return node_id
+        return [record[0] for record in records]
 
     def update_entity_node(self, entity_data: EntityData) -> None:
         """Update an existing entity node."""
-        with self.graph.session() as session:
-            query = """
-            MATCH (n:Entity {name: $name})
-            SET n.category = $category,
-                n.summary = $summary
-            """
-            summary_json = json.dumps(entity_data.summary)
-            session.run(
-                query,
-                name=entity_data.name,
-                category=entity_data.category,
-                summary=summary_json,  # Pass the JSON string
-            )
+        summary_json = json.dumps(entity_data.summary)
+        self._write(
+            UPDATE_ENTITY_QUERY,
+            name=entity_data.name,
+            category=entity_data.category,
+            summary=summary_json,  # Pass the JSON string
+        )
+
+        with self._cache_lock:
+            cached = entity_data.name in self._entity_cache
+        # MATCH only updates stored nodes, cache it only if it was known to exist
+        if cached:
+            self._cache_entity(entity_data)
 
     def create_alias(self, node_a: str, node_b: str) -> None:
         """node B will point to node A as an alias."""
 
-        with self.graph.session() as session:
-            query = """
-            MATCH (a:Entity {name: $node_a}), (b:Entity {name: $node_b})
-            MERGE (b)-[:ALIAS]->(a)
-            """
-            session.run(query, node_a=node_a, node_b=node_b)
+        self._write(CREATE_ALIAS_QUERY, node_a=node_a, node_b=node_b)
+        self._clear_entity_cache()
 
     def get_entity_node(self, name: str) -> EntityData | None:
         """Retrieve a node by its name, resolving to any aliases.
         Returns an EntityData object or None if not found."""
-        with self.graph.session() as session:
-            # Query first resolves 'name' to its canonical node (if 'name' is an alias)
-            # then returns properties of that canonical node.
-            query = """
-            MATCH (n_input:Entity {name: $name})
-            OPTIONAL MATCH (n_input)-[:ALIAS]->(aliased_to:Entity)
-            WITH CASE
-                WHEN aliased_to IS NOT NULL THEN aliased_to
-                ELSE n_input
-            END AS resolved_node
-            RETURN resolved_node.name AS name,
-                   resolved_node.category AS category,
-                   resolved_node.summary AS summary
-            """
-            result = session.run(query, name=name)
-            record = result.single()
-            if record:
+        return self.get_entity_nodes([name]).get(name)
+
+    def get_canonical_name(self, name: str) -> str | None:
+        """Resolve a name through any alias without fetching the node.
+        Returns the canonical node's name or None if not found."""
+        return self.get_canonical_names([name]).get(name)
+
+    def get_canonical_names(self, names: list[str]) -> dict[str, str]:
+        """Resolve names through any alias in one query, without fetching nodes.
+        Returns {input name: canonical name} for the names that were found."""
+        canonical_names: dict[str, str] = {}
+        missing = []
+        with self._cache_lock:
+            for name in dict.fromkeys(names):
+                canonical_name = self._canonical_names.get(name)
+                if canonical_name is None:
+                    missing.append(name)
+                else:
+                    canonical_names[name] = canonical_name
+
+        if not missing:
+            return canonical_names
+
+        records = self._read(GET_CANONICAL_NAMES_QUERY, names=missing)
+        with self._cache_lock:
+            for record in records:
+                if len(self._canonical_names) >= ENTITY_CACHE_SIZE:
+                    self._canonical_names.clear()
+                self._canonical_names[record["input"]] = record["name"]
+                canonical_names[record["input"]] = record["name"]
+        return canonical_names
+
+    def get_entity_nodes(self, names: list[str]) -> dict[str, EntityData]:
+        """Retrieve nodes by their names in one query, resolving aliases.
+        Returns {input name: EntityData} for the names that were found;
+        names resolving to the same node share one EntityData object.
+        Cached nodes are served from memory, returned objects are copies."""
+        nodes: dict[str, EntityData] = {}
+        # canonical name -> the copy returned for it
+        resolved: dict[str, EntityData] = {}
+
+        missing = []
+        for name in dict.fromkeys(names):
+            entity_node = self._cached_entity(name)
+            if entity_node is None:
+                missing.append(name)
+                continue
+            if entity_node.name not in resolved:
+                resolved[entity_node.name] = _copy_entity(entity_node)
+            nodes[name] = resolved[entity_node.name]
+
+        if not missing:
+            return nodes
+
+        for record in self._read(GET_ENTITIES_QUERY, names=missing):
+            if record["input"] in nodes:
+                continue
+            entity_node = resolved.get(record["name"])
+            if entity_node is None:
                 # deserialize the summary from JSON string
-                summary_str = record["summary"] or "{}"
-                summary_dict = json.loads(summary_str)
-                return EntityData(
+                summary_dict = json.loads(record["summary"] or "{}")
+                # stored nodes were validated when written, skip validation
+                entity_node = resolved[record["name"]] = EntityData.model_construct(
                     name=record["name"],
                     category=record["category"],
                     summary=summary_dict,
                 )
-            return None
+            nodes[record["input"]] = entity_node
+            self._cache_entity(entity_node, record["input"])
+        return nodes
 
     def delete_node(self, name: str) -> None:
         """
         Delete a node by its name.
         remove all aliases associated with the node
         """
-        with self.graph.session() as session:
-            query = """
-            MATCH (n:Entity {name: $name})
-            DETACH DELETE n
-            """
-            session.run(query, name=name)
+        self._write(DELETE_NODE_QUERY, name=name)
+        # aliases of the node now resolve to themselves
+        self._clear_entity_cache()
 
     def clear_all_data(self) -> None:
         """Deletes all nodes and relationships. USE WITH CAUTION."""
-        with self.graph.session() as session:
-            query = "MATCH (n) DETACH DELETE n"
-            session.run(query)
-            print("All data cleared from the graph.")
+        with self._session() as session:
+            if isinstance(session, Transaction):
+                raise RuntimeError("clear_all_data cannot run inside batch()")
+            session.run(CLEAR_ALL_QUERY).consume()
+        print("All data cleared from the graph.")
+        self._clear_entity_cache()
 
     def add_edge(self, source: str, target: str, edge_type: str) -> None:
         """Add an edge between two nodes."""
-        with self.graph.session() as session:
-            query = (
-                """
-            MATCH (a:Entity {name: $source}), (b:Entity {name: $target})
-            MERGE (a)-[r:%s]->(b)
-            RETURN r
-            """
-                % edge_type
+        self.add_edges([(source, target, edge_type)])
+
+    def add_edges(self, edges: list[tuple[str, str, str]]) -> None:
+        """
+        Add (source, target, edge_type) edges in one query with APOC,
+        otherwise one query per edge type.
+        """
+        if not edges:
+            return
+
+        # a new ALIAS edge changes what its source resolves to
+        adds_alias = any(edge_type == "ALIAS" for _, _, edge_type in edges)
+
+        if self._uses_apoc():
+            rows = [
+                {"source": source, "target": target, "edge_type": edge_type}
+                for source, target, edge_type in edges
+            ]
+            self._write(ADD_EDGES_APOC_QUERY, edges=rows)
+            if adds_alias:
+                self._clear_entity_cache()
+            return
+
+        pairs_by_type: dict[str, list[dict[str, str]]] = {}
+        for source, target, edge_type in edges:
+            pairs_by_type.setdefault(edge_type, []).append(
+                {"source": source, "target": target}
             )
-            session.run(query, source=source, target=target)
 
-    def get_edges_outgoing(self, node_name: str) -> list[tuple[str, str]]:
-        """Get all outgoing edges from a node."""
-        with self.graph.session() as session:
-            query = """
-            MATCH (n:Entity {name: $node_name})-[r]->(m)
-            RETURN type(r) AS edge_type, m.name AS target_node
-            """
-            result = session.run(query, node_name=node_name)
-            return [(record["edge_type"], record["target_node"]) for record in result]
-
-    def get_edges_in(self, node_name: str) -> list[tuple[str, str]]:
-        """Get all incoming edges to a node."""
-        with self.graph.session() as session:
-            query = """
-            MATCH (m)-[r]->(n:Entity {name: $node_name})
-            RETURN type(r) AS edge_type, m.name AS source_node
-            """
-            result = session.run(query, node_name=node_name)
-            return [(record["edge_type"], record["source_node"]) for record in result]
+        queries = [
+            (_template_query(ADD_EDGES_TEMPLATE, edge_type), pairs)
+            for edge_type, pairs in pairs_by_type.items()
+        ]
+
+        def add_edges_by_type(tx: ManagedTransaction | Transaction) -> None:
+            for query, pairs in queries:
+                tx.run(query, pairs=pairs).consume()
+
+        # all edge types in one transaction
+        self._transact(add_edges_by_type, write=True)
+        if adds_alias:
+            self._clear_entity_cache()
+
+    def get_edges_outgoing(self, node_name: str) -> Iterator[tuple[str, str]]:
+        """Yield (edge type, target name) for all outgoing edges from a node."""
+        result = self._stream(GET_EDGES_OUTGOING_QUERY, node_name=node_name)
+        # records are tuples in RETURN order, unpack instead of key lookups
+        for edge_type, target_node in result:
+            yield edge_type, target_node
+
+    def get_edges_in(self, node_name: str) -> Iterator[tuple[str, str]]:
+        """Yield (edge type, source name) for all incoming edges to a node."""
+        result = self._stream(GET_EDGES_IN_QUERY, node_name=node_name)
+        for edge_type, source_node in result:
+            yield edge_type, source_node
 
     def get_edge_atob(self, node_a: str, node_b: str) -> str | None:
         """get the edge attribute from ndoe A to node B"""
-        with self.graph.session() as session:
-            query = """
-            MATCH (a:Entity {name: $node_a})-[r]->(b:Entity {name: $node_b})
-            RETURN type(r) AS edge_type
-            """
-            result = session.run(query, node_a=node_a, node_b=node_b)
-            record = result.single()
-            if record:
-                return record["edge_type"]
-            return None
+        records = self._read(GET_EDGE_ATOB_QUERY, node_a=node_a, node_b=node_b)
+        if records:
+            return records[0]["edge_type"]
+        return None
 
     def delete_edge(self, source: str, target: str) -> None:
         """Delete an edge between two nodes."""
-        with self.graph.session() as session:
-            query = """
-            MATCH (a:Entity {name: $source})-[r]->(b:Entity {name: $target})
-            DELETE r
-            """
-            session.run(query, source=source, target=target)
+        self._write(DELETE_EDGE_QUERY, source=source, target=target)
+        # the deleted edge may have been an ALIAS
+        self._clear_entity_cache()
 
     def update_edge(self, source: str, target: str, edge_type: str) -> None:
         """Update an existing edge between two nodes."""
-        self.delete_edge(source, target)
-        self.add_edge(source, target, edge_type)
+        if self._uses_apoc():
+            query = UPDATE_EDGE_APOC_QUERY
+        else:
+            query = _template_query(UPDATE_EDGE_TEMPLATE, edge_type)
+        self._write(query, source=source, target=target, edge_type=edge_type)
+        # an ALIAS edge may have been replaced or created
+        self._clear_entity_cache()
 
     def is_edge_exists(self, source: str, target: str) -> bool:
         """Check if an edge exists between two nodes."""
-        with self.graph.session() as session:
-            query = """
-            MATCH (a:Entity {name: $source})-[r]->(b:Entity {name: $target})
-            RETURN COUNT(r) > 0 AS edge_exists
-            """
-            result = session.run(query, source=source, target=target)
-            record = result.single()
-
-            return record["edge_exists"] if record else False
+        records = self._read(IS_EDGE_EXISTS_QUERY, source=source, target=target)
+        return records[0]["edge_exists"] if records else False
 
     def bfs(self, start_node: str, max_depth: int) -> list[str]:
         """BFS, return including the start node"""
-        if not self.get_entity_node(start_node):
+        depth = max(int(max_depth), 0)
+        if self._uses_apoc():
+            records = self._read(BFS_APOC_QUERY, name=start_node, depth=depth)
+            nodes = [record["name"] for record in records]
+        else:
+            # every level is read in the same transaction
+            nodes = self._transact(lambda tx: self._bfs_by_level(tx, start_node, depth))
+
+        if not nodes:
             print(f"Start node '{start_node}' not found or is not an Entity.")
+        return nodes
+
+    @staticmethod
+    def _bfs_by_level(
+        tx: ManagedTransaction | Transaction, start_node: str, depth: int
+    ) -> list[str]:
+        """BFS with one query per level, the frontier holds unvisited names only"""
+        if tx.run(BFS_START_QUERY, name=start_node).single() is None:
             return []
 
-        queue = deque([(start_node, 0)])
+        nodes = [start_node]
         visited = {start_node}
-
-        result = []
-
-        while queue:
-            current_node, depth = queue.popleft()
-            result.append(current_node)
-
-            if depth < max_depth:
-                edges = self.get_edges_outgoing(current_node)
-                for edge_type, target_node in edges:
-                    if target_node not in visited:
-                        visited.add(target_node)
-                        queue.append((target_node, depth + 1))
-
-        return result
+        frontier = [start_node]
+        for _ in range(depth):
+            result = tx.run(BFS_LEVEL_QUERY, frontier=frontier)
+            frontier = []
+            for record in result:
+                name = record["name"]
+                if name not in visited:
+                    visited.add(name)
+                    frontier.append(name)
+            if not frontier:
+                break
+            nodes.extend(frontier)
+        return nodes
 
     def get_categories(self) -> list[str]:
         """Get all unique categories from the graph using a single, robust query."""
-        with self.graph.session() as session:
-            query = """
-            OPTIONAL MATCH (n:Entity)
-            WHERE n.category IS NOT NULL
-            RETURN collect(DISTINCT n.category) AS categories
-            """
-            result = session.run(query).single()
-
-            return result["categories"] if result else []
+        records = self._read(GET_CATEGORIES_QUERY)
+        return records[0]["categories"] if records else []
@@ -13,15 +13,22 @@ BOOK_ID = "46029"
 # You might want to experiment with providing a list of existing categories here.
 CONTEXT_FOR_TESTING = ""
 
+# How many random chapters to test in one run; setup is paid only once.
+ITERATIONS = 1
+
+# Seed for chapter selection, set it to replay the same chapters. None is random.
+RANDOM_SEED = None
+
 
 def main():
     """
-    This script runs a single test to help fine-tune the entity extraction prompt.
-    It does the following:
-    1. Gets the total number of chapters for the specified book.
-    2. Picks a random chapter.
+    This script runs ITERATIONS tests to help fine-tune the entity extraction
+    prompt. Chapters are picked with random.Random(RANDOM_SEED), so setting the
+    seed replays the same chapters. It does the following:
+    1. Gets the total number of chapters for the specified book, once.
+    2. Picks ITERATIONS random chapters, and for each one:
     3. Fetches the text for that random chapter.
-    4. Formats the full prompt that will be sent to the LLM.
+    4. Formats the full prompt, the text of the parts sent to the LLM.
     5. Calls the LLM and gets the raw output.
     6. Prints the full prompt and the raw output for easy evaluation.
 
@@ -35,29 +42,45 @@ def main():
     buffer = ProgressBuffer()
     extractor = EntityExtractor(book_id=BOOK_ID)
 
-    # --- 2. Get a Random Chapter ---
+    # --- 2. Get the Book Length ---
+    # Fetched once and reused by every iteration.
     try:
         total_chapters = buffer.get_book_length(BOOK_ID)
         if not total_chapters:
             print(f"Error: Book '{BOOK_ID}' not found or has 0 chapters.")
             return
+    except Exception as e:
+        print(f"An error occurred during setup: {e}")
+        return
+
+    print(f"Book ID: {BOOK_ID}")
+    print(f"Total Chapters: {total_chapters}")
+
+    rng = random.Random(RANDOM_SEED)
+    for _ in range(ITERATIONS):
+        run_prompt(buffer, extractor, rng.randint(1, total_chapters))
+
+    print("\n--- End of Test ---")
 
-        random_chapter_num = random.randint(1, total_chapters)
-        print(f"Book ID: {BOOK_ID}")
-        print(f"Total Chapters: {total_chapters}")
-        print(f"Testing with Random Chapter: {random_chapter_num}\n")
 
-        chapter_text = buffer.get_source_chunk(BOOK_ID, random_chapter_num)
+def run_prompt(
+    buffer: ProgressBuffer, extractor: EntityExtractor, chapter_num: int
+) -> None:
+    """Fetch one chapter, then print its prompt and the LLM's raw output."""
+    print(f"Testing with Random Chapter: {chapter_num}\n")
+
+    try:
+        chapter_text = buffer.get_source_chunk(BOOK_ID, chapter_num)
         if not chapter_text:
-            print(f"Error: Could not retrieve text for chapter {random_chapter_num}.")
+            print(f"Error: Could not retrieve text for chapter {chapter_num}.")
             return
-
     except Exception as e:
         print(f"An error occurred during setup: {e}")
         return
 
     # --- 3. Prepare and Display the Full Prompt ---
-    # We manually format the prompt here to show exactly what the LLM will see.
+    # The extractor sends the prompt as a list of parts, its static text and the
+    # filled fields; formatting the template gives the same text joined together.
     full_prompt = extractor.extract_prompt.format(
         context=CONTEXT_FOR_TESTING,
         text=chapter_text,
@@ -82,8 +105,6 @@ def main():
     except Exception as e:
         print(f"An error occurred while calling the LLM: {e}")
 
-    print("\n--- End of Test ---")
-
 
 if __name__ == "__main__":
     main()